@@ -1,10 +1,16 @@
 import base64
+import json
+from io import BytesIO
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import pandas as pd
+import altair as alt
 import streamlit as st
-import matplotlib.pyplot as plt
-from matplotlib import patches
-import seaborn as sns
+import matplotlib
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 
 # Inicialize o estado da página se ainda não existir
 
@@ -18,17 +24,44 @@ cores_empr = {
     "TOTAL": {"Principal": "#007c83", "Secundária": "#9c9fae"},
 }
 
+# Tema escuro do gráfico de metas, aplicado de uma vez na criação da figura
+dark_rc = {
+    'figure.facecolor': 'black',
+    'axes.facecolor': 'black',
+    'axes.labelcolor': 'white',
+    'axes.titlecolor': 'white',
+    'xtick.color': 'white',
+    'ytick.color': 'white',
+}
+
+# Data de início do ranking, as vendas até ela não são contadas
+inicio_ranking = '2023-08-10'
+
+# Corretores que não entram no ranking
+corretores_excluidos = frozenset({'Evandro Rodrigues da Silva'})
+
+# Quantidade de corretores exibidos por página do ranking
+items_per_page = 10
+
+# Nome do empreendimento como vem da API, quando difere do nome exibido no botão
+alias_empr = {"BE GARDEN": "BE GARDEN KAÁ SQUARE"}
+
+# Sessão compartilhada para reaproveitar a conexão TCP/TLS com a API entre as buscas.
+# Falhas de conexão são tentadas de novo; respostas lentas não, pelo timeout longo da API
+_SESSION = requests.Session()
+_SESSION.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=4,
+                                       max_retries=Retry(total=3, connect=3, read=0, backoff_factor=0.5)))
+
 
-@st.cache_data
 def fetch_data(url, headers):
     """Busca os dados da API.
     :param url: URL da API como string.
     :param headers: Dicionário contendo os cabeçalhos de autenticação.
     :return: Tupla contendo o conteúdo JSON se a resposta for bem-sucedida e o código de status da resposta."""
 
-    response = requests.get(url, headers=headers, timeout = 90)
+    response = _SESSION.get(url, headers=headers, timeout = 90)
     if response.status_code == 200:
-        return response.json(), response.status_code
+        return orjson.loads(response.content), response.status_code
     return None, response.status_code
 
 
@@ -36,33 +69,59 @@ def fetch_data(url, headers):
 def process_data(data):
     """Processa os dados JSON e retorna um DataFrame.
     :param data: Dados em formato JSON como dicionário.
-    :return: DataFrame processado com os dados."""
+    :return: DataFrame processado com os dados, já tipado e filtrado pela data de início do ranking."""
 
-    rows = []
+    # Uma coluna por campo, preenchidas em uma única passada pelas reservas
+    reservas, empreendimentos, corretores, ids, imobiliarias, valores, datas = [], [], [], [], [], [], []
     for key, value in data.items():
-        reserva = key
-        corretor = value["corretor"]["corretor"]
-        #Se o corretor for Evandro Rodrigues Da Silva, pule para a próxima iteração
-        if corretor == 'Evandro Rodrigues da Silva':
+        corretor = value["corretor"]
+        nome = corretor["corretor"]
+        #Se o corretor estiver na lista de excluídos, pule para a próxima iteração
+        if nome in corretores_excluidos:
+            continue
+        # Datas ISO-8601 comparadas como texto: descarta cedo as vendas de dias anteriores ao início
+        data_venda = value["data_venda"] or ''
+        if data_venda[:10] < inicio_ranking:
             continue
 
-        corretor_id = value ["corretor"]["idcorretor_cv"]
-        empreendimento = value["unidade"]["empreendimento"]
-        imobiliaria = value["corretor"]["imobiliaria"]  # Você pode escolher outro campo da imobiliária se preferir
-        valor_contrato = value["condicoes"]["valor_contrato"]
-        data_venda = value["data_venda"]
-        row = {
-            'reserva': reserva,
-            "empreendimento": empreendimento,
-            "corretor": corretor,
-            "id_corretor": corretor_id,
-            "imobiliaria": imobiliaria,
-            "valor_contrato": valor_contrato,
-            "data_venda": data_venda,
-        }
-        rows.append(row)
-
-    return pd.DataFrame(rows)
+        reservas.append(key)
+        empreendimentos.append(value["unidade"]["empreendimento"])
+        corretores.append(nome)
+        ids.append(corretor["idcorretor_cv"])
+        imobiliarias.append(corretor["imobiliaria"])  # Você pode escolher outro campo da imobiliária se preferir
+        valores.append(value["condicoes"]["valor_contrato"])
+        datas.append(data_venda)
+
+    df = pd.DataFrame({
+        'reserva': reservas,
+        'empreendimento': empreendimentos,
+        'corretor': corretores,
+        'id_corretor': pd.to_numeric(ids, downcast='integer'),
+        'imobiliaria': imobiliarias,
+        'valor_contrato': pd.to_numeric(valores).astype('float32'),
+        'data_venda': pd.to_datetime(datas, format='ISO8601', cache=True, errors='coerce'),
+    })
+
+    # Completa o corte no próprio dia de início (datas inválidas viram NaT e também saem)
+    df = df.loc[df['data_venda'] > pd.Timestamp(inicio_ranking)]
+
+    # Colunas de baixa cardinalidade viram categorias para acelerar os filtros e o groupby
+    return df.astype({'empreendimento': 'category', 'imobiliaria': 'category', 'corretor': 'category'})
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def fetch_and_process(url, headers):
+    """Busca os dados da API e já os converte no DataFrame final.
+    :param url: URL da API como string.
+    :param headers: Dicionário contendo os cabeçalhos de autenticação.
+    :return: Tupla contendo o DataFrame processado (ou None em caso de falha), o total de vendas e o código de status da resposta."""
+
+    data, status = fetch_data(url, headers)
+    if not data:
+        return None, 0, status
+    df = process_data(data)
+    # O total só muda quando os dados mudam, então é calculado junto com eles
+    return df, calcular_total_vendas(df), status
 
 
 def calcular_total_vendas(df):
@@ -86,185 +145,213 @@ def diminuir_name(name, max_length = 30):
     if len(name) <= max_length:
         return name
 
+    over = len(name) - max_length
+    saved = 0
     parts = name.split()
     for i in range(1, len(parts) - 1):
+        if saved >= over:
+            break
         # Substitua os nomes do meio por sua primeira letra e um ponto
-        if len(name) > max_length:
-            parts[i] = parts[i][0] + '.'
-            name = ' '.join(parts)
+        saved += len(parts[i]) - 2
+        parts[i] = parts[i][0] + '.'
 
-    return name
+    return ' '.join(parts)
 
 
 def filter_by_empreendimento(df, empreendimento):
     """Filtra o DataFrame por empreendimento.
-    :param df: DataFrame contendo os dados.
+    :param df: DataFrame contendo os dados, com a coluna 'empreendimento' como categoria.
     :param empreendimento: Nome do empreendimento como string.
-    :return: DataFrame filtrado com base no empreendimento."""
-    
-    if empreendimento == "BE GARDEN":
-        return df[df['empreendimento'] == 'BE GARDEN KAÁ SQUARE']        
-    if empreendimento != 'TOTAL':
-        return df[df['empreendimento'] == empreendimento]     
-    return df
+    :return: DataFrame filtrado com base no empreendimento. Deve ser tratado como somente leitura."""
+
+    if empreendimento == 'TOTAL':
+        # Devolve o próprio DataFrame, sem cópia nem máscara
+        return df
+    target = alias_empr.get(empreendimento, empreendimento)
+    categorias = df['empreendimento'].cat.categories
+    if target not in categorias:
+        return df.iloc[0:0]
+    # Compara direto os códigos inteiros da categoria, sem passar pelas strings
+    mask = df['empreendimento'].cat.codes.values == categorias.get_loc(target)
+    return df.iloc[mask.nonzero()[0]]
+
+def processar_name(names, max_length = 30):
+    """Processa os nomes, normalizando e diminuindo conforme necessário.
+    :param names: Series contendo os nomes.
+    :param max_length: Comprimento máximo permitido para cada nome.
+    :return: Series com os nomes processados."""
+
+    # Mesma regra de normalizar_nome: só a primeira letra de cada palavra fica maiúscula
+    normalized_names = (names.str.split().str.join(' ').str.lower()
+                        .str.replace(r'(?:^| )\w', lambda m: m.group(0).upper(), regex=True))
+
+    # Só os nomes longos passam pela abreviação, o restante fica como está
+    mask = normalized_names.str.len() > max_length
+    if mask.any():
+        normalized_names[mask] = [diminuir_name(name, max_length) for name in normalized_names[mask]]
+    return normalized_names
+
+
+@st.cache_data(ttl=300, max_entries=8, show_spinner=False, hash_funcs={pd.DataFrame: lambda d: pd.util.hash_pandas_object(d, index=False).sum()})
+def _aggregate(df, empreendimento):
+    """
+    Agrega as vendas por corretor para o empreendimento, guardando o resultado em cache.
 
-def processar_name(name):
-    """Processa o nome, normalizando e diminuindo conforme necessário.
-    :param name: Nome como string.
-    :return: Nome processado como string."""
+    :param df: DataFrame contendo os dados
+    :param empreendimento: Nome do empreendimento como string
+    :return: ranking, valor_max_total, total_pages
+    """
+    df = filter_by_empreendimento(df, empreendimento)
+    if df.empty:
+        # Nenhuma venda para o empreendimento, não há o que agrupar
+        return pd.DataFrame(columns=['corretor', 'valor_contrato']), 0, 0
+
+    ranking = (df.groupby('corretor', sort=False, observed=True)['valor_contrato']
+               .sum()
+               .sort_values(ascending=False)
+               .reset_index())
+    ranking['corretor'] = processar_name(ranking['corretor'])
+
+    # O ranking já está em ordem decrescente, então o maior valor é o primeiro
+    valor_max_total = ranking['valor_contrato'].iloc[0] if len(ranking) > 0 else 0
+
+    total_pages = -(-len(ranking) // items_per_page)
 
-    normalized_name = normalizar_nome(name)
-    shortened_name = diminuir_name(normalized_name)
-    return shortened_name
+    return ranking, valor_max_total, total_pages
 
 
 def prepare_data(df):
     """
-    Prepara os dados para o ranking, incluindo a filtragem por empreendimento e cores associadas.
+    Prepara os dados para o ranking, incluindo a filtragem por empreendimento.
 
     :param df: DataFrame contendo os dados
-    :return: ranking, colors, empreendimento
+    :return: ranking, empreendimento, valor_max_total
     """
     empreendimento = st.session_state.get('empreendimento', 'TOTAL')
+    ranking, valor_max_total, total_pages = _aggregate(df, empreendimento)
+    # Guardado na sessão para os botões de página não precisarem do ranking
+    st.session_state.total_pages = total_pages
 
-    df = filter_by_empreendimento(df, empreendimento)
-    first_color = cores_empr[empreendimento]["Principal"]
-    others_color = cores_empr[empreendimento]["Secundária"]
-
-    ranking = df.groupby(['corretor'], as_index=False)['valor_contrato'].sum()
-    ranking = ranking.sort_values(by='valor_contrato', ascending=False)
-    ranking['corretor'] = ranking['corretor'].apply(processar_name)
-
-    colors = [first_color] + [others_color] * (len(ranking) - 1)
-
-    return ranking, colors, empreendimento
+    return ranking, empreendimento, valor_max_total
 
-def calcular_primeiro_lugar(df):
+def calcular_primeiro_lugar(ranking, empreendimento):
     """
     Calcula o primeiro lugar no ranking.
 
-    :param df: DataFrame contendo os dados
+    :param ranking: DataFrame contendo o ranking
+    :param empreendimento: Nome do empreendimento
     :return: nome do corretor em primeiro lugar e empreendimento
     """
-    ranking, _, empreendimento = prepare_data(df)
     if len(ranking) > 0:
         primeiro_lugar = ranking.iloc[0]['corretor']
         return primeiro_lugar, empreendimento
     return None, None
 
-def select_data(ranking, colors):
+def select_data(ranking):
     """
     Seleciona os dados para a página atual do ranking.
 
     :param ranking: DataFrame contendo o ranking
-    :param colors: lista de cores
-    :return: subset_ranking, subset_colors
+    :return: subset_ranking
     """
     
-    items_per_page = 10
     start_index = st.session_state.page * items_per_page
     subset_ranking = ranking[start_index:start_index + items_per_page]
-    subset_colors = colors[start_index:start_index + items_per_page]
 
-    return subset_ranking, subset_colors
+    return subset_ranking
 
-def create_and_customize_plot(subset_ranking, subset_colors, cor_prim, cor_secund, ranking):
+def create_ranking_chart(subset_ranking, page, cor_prim, cor_secund, valor_max_total):
     """
-    Cria e personaliza o gráfico de barras para o ranking.
+    Cria o gráfico de barras do ranking, renderizado pelo navegador.
 
     :param subset_ranking: DataFrame contendo o subset do ranking
-    :param subset_colors: lista de cores para o subset
+    :param page: página atual do ranking
     :param cor_prim: cor principal
     :param cor_secund: cor secundária
-    :param ranking: DataFrame contendo o ranking completo
+    :param valor_max_total: maior valor de vendas do ranking completo
+    :return: chart - Gráfico Altair do ranking
     """
-    fig, ax = plt.subplots(figsize=(12, 10))
-    fig.patch.set_alpha(0)
-    ax.patch.set_alpha(0)
-    sns.barplot(x='valor_contrato', y='corretor', data=subset_ranking, palette=subset_colors)
-    valor_maximo = subset_ranking['valor_contrato'].max()
-    ax.set_yticks(range(len(subset_ranking['corretor'])))
-    ax.set_yticklabels([])
-
-    for idx, corretor in enumerate(subset_ranking['corretor']):
-        props = {'fontsize': 20, 'weight': 'bold'}
-        if st.session_state.page == 0 and idx == 0:
-            props['color'] = cor_prim
-            props['fontsize'] = 25
-        else:
-            props['color'] = cor_secund
-            props['fontsize'] = 22
-        posicao_x = -0.02 * valor_maximo
-        ax.text(posicao_x, idx, corretor, ha='right', va='center', **props)
-
-    if st.session_state.page == 0:
-        valor_primeiro = subset_ranking['valor_contrato'].iloc[0]
-
-        # Colocar a palavra "Líder" no meio da barra do primeiro colocado
-        ax.text(valor_primeiro / 2, 0, 'BEst Seller', ha='center', va='center', color='black', fontsize = 25)
-
-        # Adicionar uma borda ao redor da barra do primeiro colocado
-        rect = patches.Rectangle((0, -0.4), valor_primeiro, 0.8, linewidth=4, edgecolor='black', facecolor='none')
-        ax.add_patch(rect)
-
-    plt.xlabel('')
-    plt.ylabel('Corretores')
-    ax.yaxis.set_label_coords(0,0)
-    ax.yaxis.get_label().set_text('')
-    plt.title('Ranking dos Corretores')
-
-    # Personalização
-    fig.patch.set_facecolor('black')
-    ax.set_facecolor('black')
-    ax.xaxis.label.set_color('white')
-    ax.yaxis.label.set_color('white')
-    ax.title.set_color('white')
-    ax.tick_params(axis='both', colors='white')
-    ax.set_xlim(0, ranking['valor_contrato'].max())
-    ax.set(xticklabels=[])
-    if st.session_state.page == 0:
-        ax.yaxis.get_ticklabels()[0].set_fontsize(15)
-
-    st.pyplot(fig)
-
-def display_page_buttons(ranking):
+    lider = page == 0
+    # Só o primeiro colocado da primeira página recebe a cor principal e a borda
+    # A posição é a chave do eixo, assim nomes abreviados iguais não se juntam na mesma barra
+    dados = subset_ranking[['corretor', 'valor_contrato']].assign(
+        posicao=range(len(subset_ranking)),
+        cor=[cor_prim if (lider and i == 0) else cor_secund for i in range(len(subset_ranking))],
+        borda=['black' if (lider and i == 0) else 'transparent' for i in range(len(subset_ranking))],
+    )
+
+    label_color, label_size = cor_secund, 22
+    if lider:
+        # O nome do líder fica maior e na cor principal
+        label_color = {'condition': {'test': 'datum.index == 0', 'value': cor_prim}, 'value': cor_secund}
+        label_size = {'condition': {'test': 'datum.index == 0', 'value': 25}, 'value': 22}
+
+    escala_x = alt.Scale(domain=[0, float(valor_max_total)])
+    nomes = json.dumps(subset_ranking['corretor'].tolist())
+    eixo_y = alt.Y('posicao:O', sort=None, title=None,
+                   axis=alt.Axis(labelExpr=f'{nomes}[datum.value]', labelPadding=8, labelFontSize=label_size, labelFontWeight='bold',
+                                 labelColor=label_color, labelLimit=0, ticks=False, domain=False))
+
+    chart = alt.Chart(dados).mark_bar(strokeWidth=4).encode(
+        x=alt.X('valor_contrato:Q', title=None, axis=None, scale=escala_x),
+        y=eixo_y,
+        color=alt.Color('cor:N', scale=None, legend=None),
+        stroke=alt.Stroke('borda:N', scale=None, legend=None),
+    )
+
+    if lider:
+        # Colocar a palavra "BEst Seller" no meio da barra do primeiro colocado
+        destaque = alt.Chart(dados.head(1)).transform_calculate(
+            meio='datum.valor_contrato / 2'
+        ).mark_text(text='BEst Seller', color='black', fontSize=25).encode(
+            x=alt.X('meio:Q', axis=None, scale=escala_x),
+            y=eixo_y,
+        )
+        chart = chart + destaque
+
+    return (chart
+            .properties(title='Ranking dos Corretores', height=500)
+            # Fundo transparente como na figura antiga, senão o tema pinta o fundo com a cor principal do TOTAL
+            .configure(background='transparent')
+            .configure_title(color='white')
+            .configure_view(strokeWidth=0))
+
+def mudar_pagina(delta):
     """
-    Cria e personaliza o gráfico de barras para o ranking.
+    Callback dos botões de página: avança ou volta a página antes do rerun.
 
-    :param subset_ranking: DataFrame contendo o subset do ranking
-    :param subset_colors: lista de cores para o subset
-    :param cor_prim: cor principal
-    :param cor_secund: cor secundária
-    :param ranking: DataFrame contendo o ranking completo
+    :param delta: quantidade de páginas a avançar (negativo para voltar)"""
+
+    st.session_state.page += delta
+
+def display_page_buttons():
     """
-    items_per_page = 10
-    total_pages = (len(ranking) + items_per_page - 1) // items_per_page
+    Exibe os botões de navegação entre as páginas do ranking.
 
-    button_clicked = False
+    O total de páginas é lido de st.session_state.total_pages, definido em prepare_data.
+    """
+    total_pages = st.session_state.total_pages
 
     col1, _, col2 = st.columns([1, 3, 1]) # Ajuste os números para alterar o espaçamento
 
+    # O estado é atualizado no callback, antes do rerun do clique, então não é preciso um segundo rerun
     # Desabilite o botão 'Anterior' na primeira página
-    if col1.button('Anterior', key='anterior', disabled=(st.session_state.page == 0)):
-        st.session_state.page -= 1
-        button_clicked = True
+    col1.button('Anterior', key='anterior', disabled=(st.session_state.page == 0),
+                on_click=mudar_pagina, args=(-1,))
 
     # Desabilite o botão 'Próximo' na última página
-    if col2.button('Próximo', key='proximo', disabled=(st.session_state.page == total_pages - 1)):
-        st.session_state.page += 1
-        button_clicked = True
-
-    if button_clicked:
-        st.experimental_rerun()
+    col2.button('Próximo', key='proximo', disabled=(st.session_state.page == total_pages - 1),
+                on_click=mudar_pagina, args=(1,))
 
 
-def display_corretor_ranking(df):
+def display_corretor_ranking(ranking, empreendimento, valor_max_total):
     """
     Exibe o ranking dos corretores na interface.
 
-    :param df: DataFrame contendo os dados"""
+    :param ranking: DataFrame contendo o ranking
+    :param empreendimento: Nome do empreendimento
+    :param valor_max_total: maior valor de vendas do ranking"""
 
-    ranking, colors, empreendimento = prepare_data(df)
     cor_prim = cores_empr[empreendimento]['Principal']
     cor_secund = cores_empr[empreendimento]['Secundária']
 
@@ -272,9 +359,11 @@ def display_corretor_ranking(df):
         st.write("")
         return
 
-    subset_ranking, subset_colors = select_data(ranking, colors)
-    create_and_customize_plot(subset_ranking, subset_colors, cor_prim, cor_secund, ranking)
-    display_page_buttons(ranking)
+    subset_ranking = select_data(ranking)
+
+    chart = create_ranking_chart(subset_ranking, st.session_state.page, cor_prim, cor_secund, valor_max_total)
+    st.altair_chart(chart, use_container_width=True, theme=None)
+    display_page_buttons()
 
 def create_meta_plot(total_vendas, metas):
     """
@@ -284,39 +373,53 @@ def create_meta_plot(total_vendas, metas):
     :param metas: Lista contendo as metas
     :return: fig, ax - Figura e eixo do gráfico"""
     
-    fig, ax = plt.subplots(figsize=(10, 4))
+    # A figura é ligada direto ao canvas Agg, sem passar pelo pyplot nem pela escolha de backend
+    fig = Figure(figsize=(10, 4))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(111)
     fig.patch.set_alpha(0)
     ax.patch.set_alpha(0)
     
     # Cores para diferentes faixas de progresso
     bar_color = 'green' if total_vendas >= metas[1] else 'yellow' if total_vendas >= metas[0] else 'red'
-    plt.barh(['Total Vendas'], total_vendas, color=bar_color)
+    ax.barh(['Total Vendas'], total_vendas, color=bar_color)
     
     # Linhas de Meta (sempre visíveis)
     for i, meta in enumerate(metas):
         label = f'Meta {30 * (i + 1)}M'
-        plt.axvline(x=meta, color='#9c9fae' if i == 0 else '#007c83', linestyle='--', linewidth=3, label=label)
+        ax.axvline(x=meta, color='#9c9fae' if i == 0 else '#007c83', linestyle='--', linewidth=3, label=label)
     
-    plt.xlim(0, max(metas[1], total_vendas) * 1.1)
+    ax.set_xlim(0, max(metas[1], total_vendas) * 1.1)
 
     return fig, ax
 
 def customize_meta_plot(fig, ax):
     """
-    Personaliza o gráfico de meta de vendas.
+    Personaliza o gráfico de meta de vendas. As cores vêm de dark_rc.
 
     :param fig: Figura do gráfico
     :param ax: Eixo do gráfico"""
 
-    fig.patch.set_facecolor('black')
-    ax.set_facecolor('black')
-    ax.tick_params(axis='both', colors='white')
-    ax.set(xticklabels=[])
-    plt.xlabel('')
-    plt.ylabel('')
-    plt.title('Progresso das Metas', color='white')
-    a = plt.legend(loc='center left', bbox_to_anchor=(1, 0.5), frameon=False)
-    st.pyplot(fig)
+    ax.set(xticklabels=[], xlabel='', ylabel='', title='Progresso das Metas')
+    ax.legend(loc='center left', bbox_to_anchor=(1, 0.5), frameon=False)
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def build_meta_image(total_vendas, metas):
+    """
+    Desenha o gráfico de progresso das metas em PNG, guardando os bytes em cache enquanto o total não mudar.
+
+    :param total_vendas: Total de vendas alcançado
+    :param metas: Tupla contendo as metas
+    :return: bytes - Imagem PNG do gráfico"""
+
+    # O tema precisa estar ativo enquanto a figura e os eixos são criados
+    with matplotlib.rc_context(dark_rc):
+        fig, ax = create_meta_plot(total_vendas, metas)
+        customize_meta_plot(fig, ax)
+    # Cada execução tem a sua figura; só os bytes prontos são compartilhados entre as sessões
+    buffer = BytesIO()
+    fig.savefig(buffer, format='png', bbox_inches='tight', dpi=200)
+    return buffer.getvalue()
 
 def display_meta_vendas(total_vendas):
     """
@@ -324,25 +427,26 @@ def display_meta_vendas(total_vendas):
 
     :param total_vendas: Total de vendas"""
 
-    metas = [30000000, 60000000]
-    fig, ax = create_meta_plot(total_vendas, metas)
-    customize_meta_plot(fig, ax)
+    metas = (30000000, 60000000)
+    st.image(build_meta_image(total_vendas, metas), use_column_width=True)
+
+def selecionar_empreendimento():
+    """
+    Callback do seletor de empreendimento: volta para a primeira página do novo ranking."""
+
+    st.session_state.page = 0
 
 def display_empreendimento_buttons():
     """
-    Exibe os botões de empreendimento no Streamlit.
+    Exibe o seletor de empreendimento no Streamlit.
 
-    :param df: DataFrame contendo os dados"""
+    O valor escolhido fica em st.session_state.empreendimento, lido por prepare_data."""
     
     empreendimentos = ['TOTAL', 'BE GARDEN', 'BE BONIFÁCIO', 'BE DEODORO']
-    cols = st.columns(len(empreendimentos))
-    for i, empreendimento in enumerate(empreendimentos):
-        if cols[i].button(empreendimento):
-            st.session_state.empreendimento = empreendimento
-            st.session_state.page = 0
-            st.experimental_rerun()
-
-@st.cache_data
+    # Um único widget no lugar de um botão por empreendimento
+    st.radio('Empreendimento', empreendimentos, key='empreendimento', horizontal=True,
+             label_visibility='collapsed', on_change=selecionar_empreendimento)
+
 def get_base64_of_bin_file(bin_file):
     """
     Converte um arquivo binário para sua representação em base64.
@@ -354,14 +458,16 @@ def get_base64_of_bin_file(bin_file):
         data = f.read()
     return base64.b64encode(data).decode()
 
-def set_png_as_page_bg(png_file):
+@st.cache_data(show_spinner=False)
+def get_page_bg_css(png_file):
     """
-    Define uma imagem PNG como plano de fundo da página.
+    Monta o bloco <style> com a imagem de plano de fundo, guardando o resultado em cache.
 
-    :param png_file: Caminho para o arquivo PNG"""
+    :param png_file: Caminho para o arquivo PNG
+    :return: string - Bloco CSS pronto para ser inserido na página"""
 
     bin_str = get_base64_of_bin_file(png_file)
-    page_bg_img = '''
+    return '''
     <style>
     .stApp {
         background-image: url("data:image/png;base64,%s");
@@ -369,8 +475,16 @@ def set_png_as_page_bg(png_file):
     }
     </style>
     ''' % bin_str
-    
-    st.markdown(page_bg_img, unsafe_allow_html=True)
+
+def set_png_as_page_bg(png_file):
+    """
+    Define uma imagem PNG como plano de fundo da página.
+
+    :param png_file: Caminho para o arquivo PNG"""
+
+    # O Streamlit descarta os elementos que não são emitidos em um rerun,
+    # por isso o CSS é reenviado sempre, mas já vem pronto do cache
+    st.markdown(get_page_bg_css(png_file), unsafe_allow_html=True)
 
 def mensagem(primeiro_lugar, empreendimento):
     """
@@ -397,11 +511,12 @@ def mensagem(primeiro_lugar, empreendimento):
     return message
 
 
-def exibir_graficos(df):
+def exibir_graficos(df, total_vendas):
     """
     Exibe os gráficos de vendas e progresso em relação às metas no Streamlit.
 
     :param df: DataFrame contendo os dados de vendas
+    :param total_vendas: Total de vendas de todos os empreendimentos
     """
 
     hide_img_fs = '''
@@ -416,17 +531,19 @@ def exibir_graficos(df):
 
     st.markdown(hide_img_fs, unsafe_allow_html=True)
 
-    total_vendas = df['valor_contrato'].sum()
     set_png_as_page_bg('Imagens/white-background.jpeg')
 
+    # O ranking é calculado uma única vez e compartilhado pelo cabeçalho e pelo gráfico
+    ranking, empreendimento, valor_max_total = prepare_data(df)
+
     # Você pode adicionar um cabeçalho
-    primeiro_lugar, empreendimento = calcular_primeiro_lugar(df)
+    primeiro_lugar, empreendimento_lider = calcular_primeiro_lugar(ranking, empreendimento)
 
-    st.markdown(mensagem(primeiro_lugar, empreendimento), unsafe_allow_html=True)
+    st.markdown(mensagem(primeiro_lugar, empreendimento_lider), unsafe_allow_html=True)
 
     display_empreendimento_buttons()
 
-    display_corretor_ranking(df)
+    display_corretor_ranking(ranking, empreendimento, valor_max_total)
 
     # Mostrar o progresso em relação às metas
     display_meta_vendas(total_vendas)
@@ -447,16 +564,10 @@ def main():
         "token": st.secrets['User_token']
     }
 
-    data_reserva,status = fetch_data(url,headers)
-
+    df_reserva_filtrado, total_vendas, status = fetch_and_process(url, headers)
 
-    if data_reserva:
-        df_reserva_filtrado = (process_data(data_reserva)
-                              .astype({'id_corretor': int, 'valor_contrato': float})
-                              .assign(data_venda=lambda x: pd.to_datetime(x['data_venda']))
-                              .query('data_venda > "2023-08-10"'))      
-        
-        exibir_graficos(df_reserva_filtrado)
+    if df_reserva_filtrado is not None:
+        exibir_graficos(df_reserva_filtrado, total_vendas)
     else:
         if status == 504:
             mensagem_erro = "Desculpe, estamos enfrentando um atraso na resposta do servidor. Por favor, tente novamente mais tarde. Se o problema persistir, entre em contato com a nossa equipe de suporte em: gustavo.w@bravoea.com"